@@ -0,0 +1,217 @@
+"""Module for keeping the conversation history within a bounded token budget."""
+
+import json
+from dataclasses import dataclass
+from typing import Any
+
+import anthropic
+from rich.console import Console
+
+from alduin import llm, ui
+
+SUMMARY_MODEL = "claude-haiku-4-5"
+SUMMARY_MAX_TOKENS = 2048
+CONTEXT_WINDOW = 200_000
+COMPACTION_THRESHOLD = 0.75
+RECOUNT_DELTA_TOKENS = 2_000
+PINNED_MESSAGES = 1
+RECENT_TURNS = 2
+
+SUMMARY_PREFIX = "Summary of our conversation so far:\n"
+DROPPED_TOOL_RESULT = "[tool result dropped to save context, call the tool again if it is still needed]"
+
+SUMMARY_PROMPT = (
+    "Summarize the following conversation between a user and a coding assistant. "
+    "Keep every detail needed to continue the work: goals, decisions, file paths, "
+    "relevant file contents and open questions. Be concise.\n\n"
+)
+
+
+@dataclass
+class TokenBudget:
+    """The last measured size of the conversation, reused to avoid a count per LLM call."""
+
+    input_tokens: int = 0
+    message_count: int = 0
+
+
+async def compact_if_needed(
+    client: anthropic.AsyncAnthropic,
+    console: Console,
+    system_prompt: str,
+    messages: list[dict[str, Any]],
+    tool_schemas: list[dict[str, Any]],
+    budget: TokenBudget,
+) -> list[dict[str, Any]]:
+    """Summarize the middle of the conversation when it grows too large.
+
+    The conversation is measured with the token counting endpoint, unless the messages added
+    since the last count are estimated to be small and to keep the conversation within budget.
+    The first ``PINNED_MESSAGES`` messages and the last ``RECENT_TURNS`` user turns are kept
+    verbatim, everything in between is replaced by a single summary message. When there is
+    nothing to summarize or summarizing fails, the contents of older tool results are dropped.
+
+    Args:
+        client: The initialized Anthropic client.
+        console: The Rich Console for logging debug info.
+        system_prompt: The system prompt sent with every request.
+        messages: The list of messages in the conversation history.
+        tool_schemas: The list of tool schemas sent with every request.
+        budget: The last token count of the conversation, updated in place.
+
+    Returns:
+        The compacted conversation, or ``messages`` unchanged if it is within budget or cannot
+        be measured.
+    """
+
+    token_limit = CONTEXT_WINDOW * COMPACTION_THRESHOLD
+
+    # rough estimate of ~4 characters per token for the messages added since the last count
+    estimated_delta = sum(len(str(message)) // 4 for message in messages[budget.message_count :])
+    if (
+        budget.message_count
+        and estimated_delta < RECOUNT_DELTA_TOKENS
+        and budget.input_tokens + estimated_delta <= token_limit
+    ):
+        return messages
+
+    try:
+        count = await client.messages.count_tokens(
+            model=llm.MODEL,
+            system=system_prompt,
+            messages=messages,
+            tools=tool_schemas,
+        )
+    except anthropic.APIError as e:
+        # counting is best effort, try again before the next call
+        ui.print_debug(console, f"Could not count the conversation tokens, skipping compaction.\n{e}")
+        return messages
+    input_tokens = count.input_tokens
+    budget.input_tokens, budget.message_count = input_tokens, len(messages)
+    if input_tokens <= token_limit:
+        return messages
+
+    compacted = await _summarize_older_turns(client, console, messages, input_tokens)
+    if compacted is None:
+        compacted = _drop_old_tool_results(messages)
+    if compacted is None:
+        ui.print_error(
+            console,
+            f"The conversation uses {input_tokens} tokens and cannot be compacted any further. "
+            "Start a new session if the next request fails.",
+        )
+        return messages
+
+    # the conversation changed shape, measure it again on the next call
+    budget.input_tokens, budget.message_count = 0, 0
+    return compacted
+
+
+async def _summarize_older_turns(
+    client: anthropic.AsyncAnthropic,
+    console: Console,
+    messages: list[dict[str, Any]],
+    input_tokens: int,
+) -> list[dict[str, Any]] | None:
+    """Replace everything between the pinned messages and the recent turns by a summary.
+
+    Returns None if there are not enough turns to summarize, the only thing to summarize is an
+    earlier summary, or the summary request fails.
+    """
+
+    # only cut right before a user turn so no tool_use is separated from its tool_result
+    turn_starts = [
+        i for i, message in enumerate(messages) if message["role"] == "user" and isinstance(message["content"], str)
+    ]
+    if len(turn_starts) < RECENT_TURNS or turn_starts[-RECENT_TURNS] <= PINNED_MESSAGES:
+        return None
+
+    pinned = messages[:PINNED_MESSAGES]
+    middle = messages[PINNED_MESSAGES : turn_starts[-RECENT_TURNS]]
+    recent = messages[turn_starts[-RECENT_TURNS] :]
+    # summarizing a lone summary again would not make the conversation any smaller
+    if all(_is_summary(message) for message in middle):
+        return None
+
+    ui.print_debug(console, f"Compacting {len(middle)} messages ({input_tokens} tokens in context)")
+
+    try:
+        response = await client.messages.create(
+            model=SUMMARY_MODEL,
+            max_tokens=SUMMARY_MAX_TOKENS,
+            messages=[{"role": "user", "content": SUMMARY_PROMPT + _render_transcript(middle)}],
+        )
+    except anthropic.APIError as e:
+        ui.print_error(console, f"Could not summarize the conversation, skipping the summary for now.\n{e}")
+        return None
+    summary = "".join(block.text for block in response.content if block.type == "text")
+
+    summary_message = {
+        "role": "assistant",
+        "content": [
+            {
+                "type": "text",
+                "text": SUMMARY_PREFIX + summary,
+                "cache_control": llm.CACHE_CONTROL,
+            }
+        ],
+    }
+    return [*pinned, summary_message, *recent]
+
+
+def _is_summary(message: dict[str, Any]) -> bool:
+    """Check whether a message is a summary written by an earlier compaction."""
+
+    content = message["content"]
+    return (
+        message["role"] == "assistant"
+        and isinstance(content, list)
+        and len(content) == 1
+        and content[0].get("type") == "text"
+        and content[0].get("text", "").startswith(SUMMARY_PREFIX)
+    )
+
+
+def _drop_old_tool_results(messages: list[dict[str, Any]]) -> list[dict[str, Any]] | None:
+    """Replace the contents of all tool results by a short marker, except in the last message.
+
+    The last message holds the results the LLM is about to respond to, so it is kept. The
+    ``tool_result`` blocks themselves are kept so every ``tool_use`` still has its match.
+    Returns None if there is nothing left to drop.
+    """
+
+    compacted = []
+    dropped = False
+    for i, message in enumerate(messages):
+        if i < len(messages) - 1 and message["role"] == "user" and isinstance(message["content"], list):
+            content = []
+            for block in message["content"]:
+                if block.get("type") == "tool_result" and block.get("content") != DROPPED_TOOL_RESULT:
+                    block = {**block, "content": DROPPED_TOOL_RESULT}
+                    dropped = True
+                content.append(block)
+            message = {**message, "content": content}
+        compacted.append(message)
+
+    return compacted if dropped else None
+
+
+def _render_transcript(messages: list[dict[str, Any]]) -> str:
+    """Render messages as plain text for the summarization prompt."""
+
+    lines = []
+    for message in messages:
+        content = message["content"]
+        if isinstance(content, str):
+            lines.append(f"{message['role']}: {content}")
+            continue
+
+        for block in content:
+            if block["type"] == "text":
+                lines.append(f"{message['role']}: {block['text']}")
+            elif block["type"] == "tool_use":
+                lines.append(f"tool call {block['name']}: {json.dumps(block['input'])}")
+            elif block["type"] == "tool_result":
+                lines.append(f"tool result: {block['content']}")
+
+    return "\n".join(lines)
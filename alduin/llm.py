@@ -1,23 +1,39 @@
+import asyncio
 from typing import Any
 
 import anthropic
+import orjson
 from rich.console import Console
 from rich.status import Status
+from tenacity import AsyncRetrying, RetryCallState, retry_if_exception, stop_after_attempt, wait_random_exponential
 
 from alduin import ui
 
 MODEL = "claude-sonnet-4-5"
 MAX_TOKENS = 8096
+CACHE_CONTROL = {"type": "ephemeral"}
+MAX_CACHE_BREAKPOINTS = 4
+BATCH_POLL_INTERVAL_SECONDS = 30
+# the API accepts up to 100k requests and 256 MB per batch, keep some headroom for the envelope
+MAX_BATCH_REQUESTS = 100_000
+MAX_BATCH_BYTES = 200 * 1024 * 1024
+MAX_ATTEMPTS = 5
+MAX_RETRY_WAIT_SECONDS = 20
+RETRYABLE_STATUS_CODES = {408, 409, 429}
+# errors reported inside an already started stream arrive with the HTTP 200 of the stream
+RETRYABLE_ERROR_TYPES = {"overloaded_error", "api_error", "rate_limit_error"}
 
+_backoff = wait_random_exponential(multiplier=1, max=MAX_RETRY_WAIT_SECONDS)
 
-def call(
-    client: anthropic.Anthropic,
+
+async def call(
+    client: anthropic.AsyncAnthropic,
     console: Console,
     system_prompt: str,
     messages: list[dict[str, Any]],
     tool_schemas: list[dict[str, Any]],
 ) -> anthropic.types.Message:
-    """Send messages to the Anthropic API and return the LLM response.
+    """Stream messages to the Anthropic API and return the complete LLM response.
 
     Args:
         client: The initialized Anthropic client.
@@ -32,15 +48,198 @@ def call(
 
     ui.print_debug(console, f"Calling {MODEL} with {len(messages)} messages")
 
-    with Status("📜 Consulting the Elder Scrolls...", console=console, spinner="point"):
-        return client.messages.create(
-            model=MODEL,
-            system=system_prompt,
-            messages=messages,
-            tools=tool_schemas,
-            max_tokens=MAX_TOKENS,
+    def log_retry(retry_state: RetryCallState) -> None:
+        ui.print_debug(
+            console,
+            f"{MODEL} call failed ({retry_state.outcome.exception()}), retrying in "
+            f"{retry_state.next_action.sleep:.1f}s (attempt {retry_state.attempt_number + 1}/{MAX_ATTEMPTS})",
         )
 
+    # retries are handled here, so disable the SDK's own to avoid multiplying attempts
+    stream_client = client.with_options(max_retries=0)
+
+    async for attempt in AsyncRetrying(
+        retry=retry_if_exception(_is_transient_error),
+        wait=_wait_for_retry,
+        stop=stop_after_attempt(MAX_ATTEMPTS),
+        before_sleep=log_retry,
+        reraise=True,
+    ):
+        with attempt:
+            with Status("📜 Consulting the Elder Scrolls...", console=console, spinner="point") as status:
+                async with stream_client.messages.stream(
+                    **request_params(system_prompt, messages, tool_schemas)
+                ) as stream:
+                    await ui.print_streaming_reply(console, stream.text_stream, status)
+                    return await stream.get_final_message()
+
+
+async def call_batch(
+    client: anthropic.AsyncAnthropic,
+    console: Console,
+    requests: list[dict[str, Any]],
+) -> list[anthropic.types.Message | None]:
+    """Send requests through the Message Batches API and wait for the results.
+
+    Batches are processed asynchronously at a discount, which suits offline and bulk
+    workloads where nobody is waiting on an individual reply. Requests beyond the API's
+    per-batch limits are split over several batches.
+
+    Args:
+        client: The initialized Anthropic client.
+        console: The Rich Console for logging debug info.
+        requests: The request parameters, as built by ``request_params``.
+
+    Returns:
+        The LLM responses in the same order as ``requests``, None for requests that failed.
+    """
+
+    batch_ids = []
+    for chunk in _split_into_batches(requests):
+        batch = await client.messages.batches.create(requests=chunk)
+        ui.print_debug(console, f"Submitted batch {batch.id} with {len(chunk)} requests to {MODEL}")
+        batch_ids.append(batch.id)
+
+    with Status("📜 Waiting for the Elder Scrolls to be copied...", console=console, spinner="point"):
+        batches = await asyncio.gather(*(_wait_for_batch(client, batch_id) for batch_id in batch_ids))
+
+    responses = {}
+    for batch in batches:
+        counts = batch.request_counts
+        ui.print_debug(
+            console,
+            f"Batch {batch.id} ended: {counts.succeeded} succeeded · {counts.errored} errored · {counts.expired} expired",
+        )
+        async for entry in await client.messages.batches.results(batch.id):
+            if entry.result.type == "succeeded":
+                responses[entry.custom_id] = entry.result.message
+    return [responses.get(f"request-{i}") for i in range(len(requests))]
+
+
+def _split_into_batches(requests: list[dict[str, Any]]) -> list[list[dict[str, Any]]]:
+    """Split requests into batch submissions that stay below the API's count and size limits."""
+
+    batches: list[list[dict[str, Any]]] = [[]]
+    batch_bytes = 0
+    for i, params in enumerate(requests):
+        entry = {"custom_id": f"request-{i}", "params": params}
+        entry_bytes = len(orjson.dumps(entry))
+        if batches[-1] and (len(batches[-1]) >= MAX_BATCH_REQUESTS or batch_bytes + entry_bytes > MAX_BATCH_BYTES):
+            batches.append([])
+            batch_bytes = 0
+        batches[-1].append(entry)
+        batch_bytes += entry_bytes
+    return batches
+
+
+async def _wait_for_batch(
+    client: anthropic.AsyncAnthropic,
+    batch_id: str,
+) -> anthropic.types.messages.MessageBatch:
+    """Poll a message batch until it has finished processing."""
+
+    batch = await client.messages.batches.retrieve(batch_id)
+    while batch.processing_status != "ended":
+        await asyncio.sleep(BATCH_POLL_INTERVAL_SECONDS)
+        batch = await client.messages.batches.retrieve(batch_id)
+    return batch
+
+
+def _is_transient_error(error: BaseException) -> bool:
+    """Check if an API error is worth retrying (rate limits, overload, server and connection errors)."""
+
+    if isinstance(error, anthropic.APIConnectionError):
+        return True
+    if not isinstance(error, anthropic.APIStatusError):
+        return False
+    if error.status_code in RETRYABLE_STATUS_CODES or error.status_code >= 500:
+        return True
+
+    body = error.body if isinstance(error.body, dict) else {}
+    details = body.get("error")
+    return isinstance(details, dict) and details.get("type") in RETRYABLE_ERROR_TYPES
+
+
+def _wait_for_retry(retry_state: RetryCallState) -> float:
+    """Wait as long as the API asks for, or back off exponentially with jitter, capped at MAX_RETRY_WAIT_SECONDS."""
+
+    error = retry_state.outcome.exception()
+    if isinstance(error, anthropic.APIStatusError):
+        headers = error.response.headers
+        for header, scale in (("retry-after-ms", 1000), ("retry-after", 1)):
+            try:
+                return min(float(headers.get(header, "")) / scale, MAX_RETRY_WAIT_SECONDS)
+            except ValueError:
+                continue
+    return _backoff(retry_state)
+
+
+def request_params(
+    system_prompt: str,
+    messages: list[dict[str, Any]],
+    tool_schemas: list[dict[str, Any]],
+    cache_conversation: bool = True,
+) -> dict[str, Any]:
+    """Build the parameters of a Messages API request.
+
+    Args:
+        system_prompt: The system prompt to set the context for the LLM.
+        messages: The list of messages in the conversation history.
+        tool_schemas: The list of tool schemas to provide to the LLM for tool calls.
+        cache_conversation: Whether to mark the conversation itself as cacheable, for
+            conversations that are sent again with more messages appended.
+
+    Returns:
+        The keyword arguments for ``messages.create``/``messages.stream``.
+    """
+
+    # Mark the system prompt and the tool catalog as a cacheable prefix. A breakpoint on the
+    # last tool caches every tool before it as well. Prefixes shorter than the model's minimum
+    # (1024 tokens for Sonnet) are never cached, which is the case for the current system
+    # prompt and tools on their own, so the conversation carries a breakpoint as well.
+    params: dict[str, Any] = {
+        "model": MODEL,
+        "system": [{"type": "text", "text": system_prompt, "cache_control": CACHE_CONTROL}],
+        "messages": messages,
+        "max_tokens": MAX_TOKENS,
+    }
+    breakpoints = 1
+    if tool_schemas:
+        params["tools"] = [*tool_schemas[:-1], {**tool_schemas[-1], "cache_control": CACHE_CONTROL}]
+        breakpoints += 1
+
+    # compaction summaries carry their own breakpoint, the API rejects more than four in total
+    breakpoints += sum(
+        "cache_control" in block
+        for message in messages
+        if isinstance(message["content"], list)
+        for block in message["content"]
+    )
+    if cache_conversation and breakpoints < MAX_CACHE_BREAKPOINTS:
+        params["messages"] = _with_cache_breakpoint(messages)
+    return params
+
+
+def _with_cache_breakpoint(messages: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Return a copy of the messages with a cache breakpoint on the last content block.
+
+    The next request resends the same messages followed by new ones, so caching up to the end
+    of this request lets the next one read the whole conversation so far from the cache.
+    """
+
+    if not messages or not messages[-1]["content"]:
+        return messages
+
+    last = messages[-1]
+    content = last["content"]
+    if isinstance(content, str):
+        content = [{"type": "text", "text": content}]
+    if "cache_control" in content[-1]:
+        return messages
+
+    content = [*content[:-1], {**content[-1], "cache_control": CACHE_CONTROL}]
+    return [*messages[:-1], {**last, "content": content}]
+
 
 if __name__ == "__main__":
     import os
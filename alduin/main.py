@@ -1,61 +1,194 @@
 """Alduin - A minimal CLI coding agent."""
 
+import argparse
+import asyncio
+import json
 import os
+from pathlib import Path
 from typing import Any
 
 import anthropic
 import dotenv
-from rich.console import Console
+import httpx
+import orjson
 import rich.pretty
-from alduin import llm, theme, ui, system_prompt, schema_converter, tool
+from prompt_toolkit import PromptSession
+from rich.console import Console
+
+from alduin import compaction, llm, schema_converter, system_prompt, theme, tool, ui
+
+DEFAULT_TOOL_CONCURRENCY_LIMIT = 8
+TRUE_VALUES = {"1", "true", "yes", "on"}
+FALSE_VALUES = {"", "0", "false", "no", "off"}
+
+# tools without side effects whose results can be reused within a user turn
+CACHEABLE_TOOLS = {tool.read_file.__name__, tool.list_files.__name__}
+
+# keep connections to the API warm across the many calls of a tool loop
+HTTP_LIMITS = httpx.Limits(max_keepalive_connections=32, max_connections=64)
+HTTP_TIMEOUT = httpx.Timeout(60.0, connect=5.0)
 
 
 def execute_tool(
     name_of_the_tool_to_execute: str,
-    tools_lookup_table: dict[str, Any],
+    active_tool_names: frozenset[str],
     args: Any,
-    console: Console,
-) -> str:
-    # get the tool function to execute
-    tool_fn = tools_lookup_table.get(name_of_the_tool_to_execute)
-    if not tool_fn:
+) -> tuple[str, bool]:
+    """Run a single tool call without touching the console.
+
+    Runs in a worker thread; all UI output happens in ``execute_tools``.
+
+    Args:
+        name_of_the_tool_to_execute: The name of the tool requested by the LLM.
+        active_tool_names: The names of the tools enabled for this session.
+        args: The arguments to call the tool with.
+
+    Returns:
+        A tuple of (result or error message, whether the call failed).
+    """
+    # get the tool function to execute, only tools offered to the LLM may run
+    tool_fn = None
+    if name_of_the_tool_to_execute in active_tool_names:
+        tool_fn = tool.REGISTRY.get(name_of_the_tool_to_execute)
+    if tool_fn is None:
         error_msg = f"Error: Requested tool do not exists {name_of_the_tool_to_execute}"
-        ui.print_tool_error(
-            console=console, name=name_of_the_tool_to_execute, error=error_msg
-        )
-    ui.print_tool_request(console=console, name=name_of_the_tool_to_execute, args=args)
+        return error_msg, True
     try:
-        result = tool_fn(**args)
-        ui.print_tool_result(
-            console=console, name=name_of_the_tool_to_execute, result=result
-        )
-        return result
+        return tool_fn(**args), False
     except Exception as e:
-        error_msg = f'Error: Calling tool {name_of_the_tool_to_execute}\n{e}'
-        ui.print_tool_error(
-            console=console, name=name_of_the_tool_to_execute, error=error_msg
-        )
+        error_msg = f"Error: Calling tool {name_of_the_tool_to_execute}\n{e}"
+        return error_msg, True
+
+
+async def execute_tools(
+    tool_use_blocks: list[Any],
+    active_tool_names: frozenset[str],
+    tool_cache: dict[tuple, str],
+    concurrency_limit: int,
+    console: Console,
+) -> list[str]:
+    """Execute the requested tool calls concurrently and display them in order.
+
+    Identical calls (same tool name and arguments) are executed only once and their
+    result is shared by every block that requested it. Successful results of read-only
+    tools are memoized in ``tool_cache`` as long as the target path is unchanged. Large
+    results are truncated after the memo lookup, so a reused result always refers to a
+    stored result that ``fetch_chunk`` can still page through.
+
+    Args:
+        tool_use_blocks: The ``tool_use`` content blocks from the LLM response.
+        active_tool_names: The names of the tools enabled for this session.
+        tool_cache: Memoized results of read-only tool calls for the current user turn.
+        concurrency_limit: The maximum number of tool calls running at the same time.
+        console: The Rich Console for logging and UI.
+
+    Returns:
+        The tool results, in the same order as ``tool_use_blocks`` regardless of which call
+        finishes first. The order of the ``tool_result`` blocks sent back is part of the cached
+        prompt prefix, so it must be deterministic.
+    """
 
-        return error_msg
+    unique_calls = {}
+    for block in tool_use_blocks:
+        unique_calls.setdefault(_tool_call_key(block.name, block.input), block)
 
+    for block in unique_calls.values():
+        ui.print_tool_request(console=console, name=block.name, args=block.input)
 
-def agent_loop(client: anthropic.Anthropic, console: Console) -> None:
+    cache_keys = {key: _tool_cache_key(block.name, block.input) for key, block in unique_calls.items()}
+
+    semaphore = asyncio.Semaphore(concurrency_limit)
+
+    async def run(block: Any) -> tuple[str, bool]:
+        async with semaphore:
+            return await asyncio.to_thread(execute_tool, block.name, active_tool_names, block.input)
+
+    # gather returns results in submission order, not completion order
+    pending = [key for key in unique_calls if cache_keys[key] not in tool_cache]
+    executed = dict(zip(pending, await asyncio.gather(*(run(unique_calls[key]) for key in pending))))
+
+    results = {}
+    for key, block in unique_calls.items():
+        if key in executed:
+            result, failed = executed[key]
+            if not failed and cache_keys[key] is not None:
+                tool_cache[cache_keys[key]] = result
+        else:
+            result, failed = tool_cache[cache_keys[key]], False
+
+        if failed:
+            ui.print_tool_error(console=console, name=block.name, error=result)
+        else:
+            result = tool.compact_result(result)
+            ui.print_tool_result(console=console, name=block.name, result=result)
+        results[key] = result
+
+    # fan the shared results back out to every requesting block
+    return [results[_tool_call_key(block.name, block.input)] for block in tool_use_blocks]
+
+
+def _tool_call_key(name: str, args: Any) -> tuple[str, str]:
+    """Build a hashable key identifying a tool call by its name and arguments."""
+
+    return name, json.dumps(args, sort_keys=True)
+
+
+def _tool_cache_key(name: str, args: Any) -> tuple | None:
+    """Build the memoization key for a read-only tool call, or None if it must not be cached.
+
+    The modification time of the target path is part of the key, so results are
+    invalidated as soon as the file or directory changes.
+    """
+
+    if name not in CACHEABLE_TOOLS:
+        return None
+    try:
+        mtime_ns = Path(args["path"]).stat().st_mtime_ns
+    except (KeyError, TypeError, OSError):
+        return None
+    return *_tool_call_key(name, args), mtime_ns
+
+
+async def agent_loop(
+    client: anthropic.AsyncAnthropic,
+    console: Console,
+    tool_concurrency_limit: int,
+    debug: bool = False,
+) -> None:
     """Run the main agent loop: read input, call LLM, execute tools, repeat.
 
     Args:
         client: The initialized Anthropic client.
         console: The Rich Console for logging and UI.
+        tool_concurrency_limit: The maximum number of tool calls running at the same time.
+        debug: Pretty-print every full LLM response.
     """
 
     conversation: list[dict[str, Any]] = []
 
-    active_tools = [tool.read_file, tool.list_files]
+    active_tools = [tool.read_file, tool.list_files, tool.fetch_chunk]
 
-    tools_lookup = {t.__name__: t for t in active_tools}
+    active_tool_names = frozenset(t.__name__ for t in active_tools)
+
+    # active tools never change during a session, so build the schemas once and send the
+    # exact same payload on every call (a precondition for prompt cache hits)
+    tool_schemas = schema_converter.generate_tool_schema(active_tools, minify=True)
+
+    # same for the system prompt, changing it would invalidate the cached prefix anyway
+    system_prompt_text = system_prompt.get()
+
+    tool_cache: dict[tuple, str] = {}
+
+    token_budget = compaction.TokenBudget()
+
+    session: PromptSession[str] = PromptSession()
 
     while True:
+        # memoized tool results only live for a single user turn
+        tool_cache.clear()
+
         try:
-            user_input = input("🧑‍💻 You: ").strip()
+            user_input = (await session.prompt_async("🧑‍💻 You: ")).strip()
         except (KeyboardInterrupt, EOFError):
             ui.clear_previous_line()
             ui.print_goodbye(console)
@@ -71,52 +204,80 @@ def agent_loop(client: anthropic.Anthropic, console: Console) -> None:
 
         # Start sub agent loop break when there is no call for tools
         while True:
+            # summarize older turns once the history gets close to the context window
+            conversation = await compaction.compact_if_needed(
+                client=client,
+                console=console,
+                system_prompt=system_prompt_text,
+                messages=conversation,
+                tool_schemas=tool_schemas,
+                budget=token_budget,
+            )
             # import the call method from llm module
-            llm_response = llm.call(
+            llm_response = await llm.call(
                 console=console,
                 client=client,
-                system_prompt=system_prompt.get(),
+                system_prompt=system_prompt_text,
                 messages=conversation,
-                tool_schemas=schema_converter.generate_tool_schema(active_tools),
+                tool_schemas=tool_schemas,
+            )
+            # Append previous conversation to the list, as plain dicts so the SDK does not have to
+            # convert the same content blocks again on every following call
+            conversation.append(
+                {
+                    "role": "assistant",
+                    "content": [block.model_dump(exclude_none=True) for block in llm_response.content],
+                }
             )
-            # Append previous conversation to the list
-            conversation.append({'role': 'assistant', 'content': llm_response.content})
 
             tool_results = []
 
-            # display llm response
-            rich.pretty.pprint(llm_response)
+            # display llm response, the full dump is expensive so only do it when debugging
+            if debug:
+                rich.pretty.pprint(llm_response)
+            ui.print_debug(
+                console,
+                f"stop reason: {llm_response.stop_reason} · "
+                f"tokens: {llm_response.usage.input_tokens} in · {llm_response.usage.output_tokens} out · "
+                f"content blocks: {len(llm_response.content)}",
+            )
 
             # assistant_reply = (
             #     "Krosis. That knowledge cannot be known to me. "
             #     "Even the Firstborn of Akatosh has limits. Very few. But they exist."
             # )
+            tool_use_blocks = []
             for block in llm_response.content:
                 # check if response block wants to use tool
-                if block.type == 'text':
+                if block.type == "text":
                     ui.print_assistant_reply(
                         console=console,
                         text=block.text,
                         input_tokens=llm_response.usage.input_tokens,
                         output_tokens=llm_response.usage.output_tokens,
+                        cache_read_tokens=llm_response.usage.cache_read_input_tokens,
+                        cache_creation_tokens=llm_response.usage.cache_creation_input_tokens,
                     )
-                elif block.type == 'tool_use':
-                    result = execute_tool(
-                        name_of_the_tool_to_execute=block.name,
-                        tools_lookup_table=tools_lookup,
-                        args=block.input,
-                        console=console,
-                    )
-                    tool_results.append(
-                        {
-                            "type": "tool_result",
-                            "tool_use_id": block.id,
-                            "content": result,
-                        }
-                    )
-                    # print(
-                    #     f'tool use requested for tool {block.name} with args {block.input}'
-                    # )
+                elif block.type == "tool_use":
+                    tool_use_blocks.append(block)
+
+            # run all requested tools at once, results come back in the order the blocks appear in
+            # the response so identical responses always produce byte-identical tool_result messages
+            results = await execute_tools(
+                tool_use_blocks=tool_use_blocks,
+                active_tool_names=active_tool_names,
+                tool_cache=tool_cache,
+                concurrency_limit=tool_concurrency_limit,
+                console=console,
+            )
+            for block, result in zip(tool_use_blocks, results):
+                tool_results.append(
+                    {
+                        "type": "tool_result",
+                        "tool_use_id": block.id,
+                        "content": result,
+                    }
+                )
             # break when there are no more tool to call
             if not tool_results:
                 break
@@ -128,12 +289,89 @@ def agent_loop(client: anthropic.Anthropic, console: Console) -> None:
             )
 
 
+async def run_batch(
+    client: anthropic.AsyncAnthropic,
+    console: Console,
+    inputs_path: Path,
+    output_path: Path,
+) -> None:
+    """Answer every prompt of a JSONL file through the Message Batches API.
+
+    Each input line is a JSON object with a ``prompt`` key. Prompts are answered
+    without tools, and one JSON object with the ``prompt`` and its ``response``
+    (null if the request failed) is written per line to ``output_path``.
+
+    Args:
+        client: The initialized Anthropic client.
+        console: The Rich Console for logging and UI.
+        inputs_path: The JSONL file with the prompts.
+        output_path: The JSONL file to write the responses to.
+    """
+
+    try:
+        lines = inputs_path.read_text().splitlines()
+    except OSError as e:
+        ui.print_error(console, f"Could not read {inputs_path}: {e}")
+        return
+
+    prompts = []
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            entry = orjson.loads(line)
+        except orjson.JSONDecodeError as e:
+            ui.print_error(console, f"{inputs_path}:{line_number}: invalid JSON: {e}")
+            return
+        if not isinstance(entry, dict) or not isinstance(entry.get("prompt"), str):
+            ui.print_error(console, f'{inputs_path}:{line_number}: expected an object with a "prompt" string')
+            return
+        prompts.append(entry["prompt"])
+
+    if not prompts:
+        ui.print_error(console, f"No prompts found in {inputs_path}")
+        return
+
+    system_prompt_text = system_prompt.get()
+    requests = [
+        llm.request_params(
+            system_prompt_text, [{"role": "user", "content": prompt}], tool_schemas=[], cache_conversation=False
+        )
+        for prompt in prompts
+    ]
+    responses = await llm.call_batch(client=client, console=console, requests=requests)
+
+    with output_path.open("wb") as output:
+        for prompt, response in zip(prompts, responses):
+            text = None
+            if response is not None:
+                text = "".join(block.text for block in response.content if block.type == "text")
+            output.write(orjson.dumps({"prompt": prompt, "response": text}) + b"\n")
+
+    ui.print_debug(console, f"Wrote {len(responses)} responses to {output_path}")
+
+
 def main() -> None:
     """Entry point for the Alduin CLI agent.
 
-    Initializes console, checks API key, and starts the agent loop.
+    Initializes console, checks API key, and starts the agent loop, or processes
+    a file of prompts in batch mode when ``--batch`` is given.
     """
 
+    parser = argparse.ArgumentParser(prog="alduin", description="🐉 Alduin - Your Personal CLI Coding Agent")
+    parser.add_argument(
+        "--batch",
+        type=Path,
+        metavar="INPUTS",
+        help="answer the prompts of a JSONL file via the Message Batches API instead of chatting",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        help="where to write batch responses (default: INPUTS with a .results.jsonl suffix)",
+    )
+    args = parser.parse_args()
+
     console = Console(theme=theme.ALDUIN_THEME)
     ui.print_banner(console)
 
@@ -142,8 +380,35 @@ def main() -> None:
         ui.print_error(console, "ANTHROPIC_API_KEY environment variable is not set.")
         return
 
-    client = anthropic.Anthropic(api_key=api_key)
-    agent_loop(client=client, console=console)
+    # read after dotenv has been loaded so values from .env are honored
+    tool_concurrency_limit = os.getenv("TOOL_CONCURRENCY_LIMIT", str(DEFAULT_TOOL_CONCURRENCY_LIMIT))
+    if not tool_concurrency_limit.strip().isdigit() or int(tool_concurrency_limit) < 1:
+        ui.print_error(console, f"TOOL_CONCURRENCY_LIMIT must be a positive integer, got {tool_concurrency_limit!r}.")
+        return
+
+    debug = os.getenv("ALDUIN_DEBUG", "").strip().lower()
+    if debug not in TRUE_VALUES | FALSE_VALUES:
+        ui.print_error(console, f"ALDUIN_DEBUG must be one of 1/true/yes/on or 0/false/no/off, got {debug!r}.")
+        return
+
+    client = anthropic.AsyncAnthropic(
+        api_key=api_key,
+        http_client=anthropic.DefaultAsyncHttpxClient(http2=True, limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT),
+    )
+
+    if args.batch:
+        output_path = args.output or args.batch.with_suffix(".results.jsonl")
+        asyncio.run(run_batch(client=client, console=console, inputs_path=args.batch, output_path=output_path))
+        return
+
+    asyncio.run(
+        agent_loop(
+            client=client,
+            console=console,
+            tool_concurrency_limit=int(tool_concurrency_limit),
+            debug=debug in TRUE_VALUES,
+        )
+    )
 
 
 if __name__ == "__main__":
@@ -4,8 +4,11 @@ import inspect
 import re
 import types
 import typing
+from collections.abc import Callable
 from typing import Any, Literal, Union, get_args, get_origin
 
+MAX_DESCRIPTION_LENGTH = 240
+
 
 def _python_type_to_json_schema(annotation: Any) -> dict:
     """Convert a Python type annotation to a JSON schema type dict."""
@@ -133,60 +136,97 @@ def _parse_google_docstring(docstring: str) -> tuple:
     return description, arg_descriptions
 
 
-def generate_tool_schema(functions: list) -> list:
-    """Generate Anthropic tool JSON schemas from a list of Python functions.
+def _minify_description(description: str) -> str:
+    """Collapse whitespace in a description and truncate it to MAX_DESCRIPTION_LENGTH characters."""
+    description = " ".join(description.split())
+    if len(description) > MAX_DESCRIPTION_LENGTH:
+        description = description[: MAX_DESCRIPTION_LENGTH - 1].rstrip() + "…"
+    return description
+
+
+def _minify_schema(schema: dict) -> dict:
+    """Recursively drop titles and shorten descriptions of a JSON schema to save prompt tokens."""
+    minified: dict = {}
+    for key, value in schema.items():
+        if key == "title":
+            continue
+        if key == "description" and isinstance(value, str):
+            minified[key] = _minify_description(value)
+        elif key == "properties" and isinstance(value, dict):
+            minified[key] = {name: _minify_schema(prop) for name, prop in value.items()}
+        elif isinstance(value, dict):
+            minified[key] = _minify_schema(value)
+        else:
+            minified[key] = value
+    return minified
+
+
+def function_to_schema(func: Callable) -> dict:
+    """Generate the Anthropic tool JSON schema of a single Python function.
 
-    Reads function names, type annotations, and Google-style docstrings to
-    produce tool definitions compatible with the Anthropic API.
+    Reads the function name, type annotations, and Google-style docstring to
+    produce a tool definition compatible with the Anthropic API.
 
     Args:
-        functions: Python callables with type annotations and Google-style
-            docstrings.
+        func: A Python callable with type annotations and a Google-style docstring.
 
     Returns:
-        A list of tool schema dicts ready to pass as the ``tools`` parameter
-        to the Anthropic API.
+        The tool schema dict.
     """
-    tools: list = []
+    sig = inspect.signature(func)
+    docstring = inspect.getdoc(func) or ""
+    description, arg_descriptions = _parse_google_docstring(docstring)
 
-    for func in functions:
-        sig = inspect.signature(func)
-        docstring = inspect.getdoc(func) or ""
-        description, arg_descriptions = _parse_google_docstring(docstring)
+    # Resolve stringified annotations (from __future__ annotations)
+    try:
+        hints = typing.get_type_hints(func)
+    except Exception:
+        hints = {}
 
-        # Resolve stringified annotations (from __future__ annotations)
-        try:
-            hints = typing.get_type_hints(func)
-        except Exception:
-            hints = {}
+    properties: dict = {}
+    required: list = []
 
-        properties: dict = {}
-        required: list = []
+    for param_name, param in sig.parameters.items():
+        if param_name in ("self", "cls"):
+            continue
 
-        for param_name, param in sig.parameters.items():
-            if param_name in ("self", "cls"):
-                continue
+        annotation = hints.get(param_name, param.annotation)
+        prop = _python_type_to_json_schema(annotation)
 
-            annotation = hints.get(param_name, param.annotation)
-            prop = _python_type_to_json_schema(annotation)
+        if param_name in arg_descriptions:
+            prop["description"] = arg_descriptions[param_name]
 
-            if param_name in arg_descriptions:
-                prop["description"] = arg_descriptions[param_name]
+        properties[param_name] = prop
 
-            properties[param_name] = prop
+        if param.default is inspect.Parameter.empty:
+            required.append(param_name)
 
-            if param.default is inspect.Parameter.empty:
-                required.append(param_name)
+    return {
+        "name": func.__name__,
+        "description": description,
+        "input_schema": {
+            "type": "object",
+            "properties": properties,
+            "required": required,
+        },
+    }
+
+
+def generate_tool_schema(functions: list, minify: bool = False) -> list:
+    """Generate Anthropic tool JSON schemas from a list of Python functions.
+
+    Uses the schema precomputed by the ``tool.tool_schema`` decorator when
+    available and only falls back to reflection for undecorated functions.
 
-        tool: dict = {
-            "name": func.__name__,
-            "description": description,
-            "input_schema": {
-                "type": "object",
-                "properties": properties,
-                "required": required,
-            },
-        }
-        tools.append(tool)
+    Args:
+        functions: Python callables with type annotations and Google-style
+            docstrings.
+        minify: Drop titles and collapse/truncate descriptions to reduce the
+            number of prompt tokens spent on the tool catalog.
 
-    return tools
+    Returns:
+        A list of tool schema dicts ready to pass as the ``tools`` parameter
+        to the Anthropic API.
+    """
+    tools = [getattr(func, "schema", None) or function_to_schema(func) for func in functions]
+    return [_minify_schema(tool) for tool in tools] if minify else tools
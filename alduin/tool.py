@@ -1,8 +1,56 @@
 """Module for tool implementations for the coding agent."""
 
+import hashlib
+import threading
+from collections import OrderedDict
+from collections.abc import Callable
 from pathlib import Path
 
+from alduin import schema_converter
 
+LARGE_RESULT_THRESHOLD = 4096
+SNIPPET_LENGTH = 2048
+CHUNK_LENGTH = 3072
+MAX_STORED_RESULTS = 32
+
+# all tool functions by the name the LLM uses to call them, filled by @tool_schema
+REGISTRY: dict[str, Callable[..., str]] = {}
+
+# full contents of the most recent large tool results, keyed by their sha1 digest. Tools run
+# in worker threads, so access goes through the lock.
+_stored_results: OrderedDict[str, str] = OrderedDict()
+_stored_results_lock = threading.Lock()
+
+
+def tool_schema(func: Callable[..., str]) -> Callable[..., str]:
+    """Decorator that precomputes the tool schema of a tool function and registers it.
+
+    The schema is attached as ``func.schema`` once at import time, so building the tool
+    catalog needs no reflection. The function is added to ``REGISTRY`` under its name.
+
+    Args:
+        func: The tool function.
+
+    Returns:
+        The same function with its ``schema`` attribute set.
+
+    Raises:
+        ValueError: If another tool is already registered under the same name.
+    """
+
+    existing = REGISTRY.get(func.__name__)
+    if existing is not None:
+        raise ValueError(
+            f"Tool name {func.__name__} of {func.__module__}.{func.__qualname__} "
+            f"is already used by {existing.__module__}.{existing.__qualname__}"
+        )
+
+    func.schema = schema_converter.function_to_schema(func)
+    REGISTRY[func.__name__] = func
+    return func
+
+
+@tool_schema
 def read_file(path: str) -> str:
     """Read the contents of a file.
 
@@ -21,6 +69,7 @@ def read_file(path: str) -> str:
     return path_file.read_text()
 
 
+@tool_schema
 def edit_file(path: str, old_str: str, new_str: str) -> str:
     """Create or edit a file by replacing occurrences of a string.
 
@@ -38,6 +87,7 @@ def edit_file(path: str, old_str: str, new_str: str) -> str:
     pass
 
 
+@tool_schema
 def list_files(path: str) -> str:
     """List files in a directory.
 
@@ -60,6 +110,7 @@ def list_files(path: str) -> str:
     return "\n".join(lines)
 
 
+@tool_schema
 def bash(command: str) -> str:
     """Execute a bash command and return its output.
 
@@ -73,3 +124,61 @@ def bash(command: str) -> str:
     """
 
     pass
+
+
+@tool_schema
+def fetch_chunk(result_id: str, offset: int = 0) -> str:
+    """Fetch a chunk of a large tool result that was truncated.
+
+    Args:
+        result_id: The id of the truncated result.
+        offset: The character offset to start reading from.
+
+    Returns:
+        The requested chunk of the result, or an error message.
+    """
+
+    with _stored_results_lock:
+        content = _stored_results.get(result_id)
+    if content is None:
+        return f"Error: no stored result with id {result_id}, call the original tool again"
+    if not 0 <= offset < len(content):
+        return f"Error: offset {offset} is out of range, the result has {len(content)} characters"
+
+    chunk = content[offset : offset + CHUNK_LENGTH]
+    end = offset + len(chunk)
+    if end < len(content):
+        chunk += f"\n[{len(content) - end} characters left, continue with offset={end}]"
+    return chunk
+
+
+def compact_result(result: str) -> str:
+    """Shrink a tool result before it is sent back to the LLM.
+
+    Empty results are replaced by a short marker. Large results are replaced by a snippet
+    and a reference to the full content, which the LLM can page through with ``fetch_chunk``.
+
+    Args:
+        result: The tool result.
+
+    Returns:
+        The result unchanged if it is small, otherwise a marker or a truncated envelope.
+    """
+
+    if not result.strip():
+        return "(empty result)"
+    if len(result) <= LARGE_RESULT_THRESHOLD:
+        return result
+
+    result_id = hashlib.sha1(result.encode()).hexdigest()
+    with _stored_results_lock:
+        _stored_results[result_id] = result
+        _stored_results.move_to_end(result_id)
+        # only keep the most recent results around
+        while len(_stored_results) > MAX_STORED_RESULTS:
+            _stored_results.popitem(last=False)
+    return (
+        f"[truncated {len(result) // 1024}KB; first {SNIPPET_LENGTH // 1024}KB]\n"
+        f"{result[:SNIPPET_LENGTH]}\n"
+        f"[call tool `fetch_chunk` with result_id={result_id} and offset={SNIPPET_LENGTH} for more]"
+    )
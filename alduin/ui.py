@@ -2,10 +2,13 @@
 
 import json
 import random
+from collections.abc import AsyncIterable
 
 from rich.console import Console
+from rich.live import Live
 from rich.markdown import Markdown
 from rich.panel import Panel
+from rich.status import Status
 from rich.text import Text
 
 from alduin import personality, theme
@@ -74,7 +77,14 @@ def print_user_message(console: Console, text: str) -> None:
     )
 
 
-def print_assistant_reply(console: Console, text: str, input_tokens: int, output_tokens: int) -> None:
+def print_assistant_reply(
+    console: Console,
+    text: str,
+    input_tokens: int,
+    output_tokens: int,
+    cache_read_tokens: int | None = None,
+    cache_creation_tokens: int | None = None,
+) -> None:
     """Display the assistant's markdown reply with token usage.
 
     Args:
@@ -82,23 +92,56 @@ def print_assistant_reply(console: Console, text: str, input_tokens: int, output
         text: The assistant's reply in markdown format.
         input_tokens: The number of tokens in the user's input.
         output_tokens: The number of tokens in the assistant's output.
+        cache_read_tokens: The number of input tokens served from the prompt cache.
+        cache_creation_tokens: The number of input tokens written to the prompt cache.
     """
 
-    subtitle = f"[system]tokens: {input_tokens} in · {output_tokens} out[/system]"
-    console.print(
-        Panel(
-            Markdown(text),
-            title="[assistant_name]🐉 Alduin[/assistant_name]",
-            title_align="left",
-            subtitle=subtitle,
-            subtitle_align="right",
-            border_style=theme.ASSISTANT_BORDER,
-            padding=(0, 1),
-        )
-    )
+    usage = f"tokens: {input_tokens} in · {output_tokens} out"
+    if cache_read_tokens or cache_creation_tokens:
+        usage += f" · cache: {cache_read_tokens or 0} read · {cache_creation_tokens or 0} written"
+    console.print(_assistant_panel(text, subtitle=f"[system]{usage}[/system]"))
     console.print()
 
 
+async def print_streaming_reply(console: Console, text_stream: AsyncIterable[str], status: Status) -> None:
+    """Render the assistant's reply live while it is being streamed.
+
+    The waiting spinner is stopped as soon as the first chunk arrives. The live preview is
+    transient, the final reply is printed with ``print_assistant_reply`` once token usage is known.
+
+    Args:
+        console: The Rich Console to print to.
+        text_stream: The text chunks of the reply as they arrive.
+        status: The running spinner shown while waiting for the first chunk.
+    """
+
+    chunks = aiter(text_stream)
+    text = await anext(chunks, "")
+    status.stop()
+
+    if not text:
+        return
+
+    with Live(_assistant_panel(text), console=console, transient=True) as live:
+        async for chunk in chunks:
+            text += chunk
+            live.update(_assistant_panel(text))
+
+
+def _assistant_panel(text: str, subtitle: str | None = None) -> Panel:
+    """Build the panel used to display the assistant's markdown reply."""
+
+    return Panel(
+        Markdown(text),
+        title="[assistant_name]🐉 Alduin[/assistant_name]",
+        title_align="left",
+        subtitle=subtitle,
+        subtitle_align="right",
+        border_style=theme.ASSISTANT_BORDER,
+        padding=(0, 1),
+    )
+
+
 def print_tool_request(console: Console, name: str, args: dict) -> None:
     """Display a panel when a tool call is about to execute.
 
@@ -0,0 +1,154 @@
+"""Tests for conversation compaction."""
+
+import asyncio
+import io
+from types import SimpleNamespace
+from unittest import mock
+
+import httpx
+from anthropic import APIConnectionError
+from rich.console import Console
+
+from alduin import compaction
+
+CONNECTION_ERROR = APIConnectionError(request=httpx.Request("POST", "https://api.anthropic.com/v1/messages"))
+
+
+def _client(
+    input_tokens: int, summary_error: Exception | None = None, count_error: Exception | None = None
+) -> mock.MagicMock:
+    """Build a fake Anthropic client reporting a fixed token count."""
+    client = mock.MagicMock()
+    client.messages.count_tokens = mock.AsyncMock(
+        return_value=SimpleNamespace(input_tokens=input_tokens), side_effect=count_error
+    )
+    client.messages.create = mock.AsyncMock(
+        return_value=SimpleNamespace(content=[SimpleNamespace(type="text", text="SUMMARY")]),
+        side_effect=summary_error,
+    )
+    return client
+
+
+def _compact(client: mock.MagicMock, messages: list[dict]) -> list[dict]:
+    return asyncio.run(
+        compaction.compact_if_needed(
+            client=client,
+            console=Console(file=io.StringIO()),
+            system_prompt="system",
+            messages=messages,
+            tool_schemas=[],
+            budget=compaction.TokenBudget(),
+        )
+    )
+
+
+def _tool_round(tool_use_id: str) -> list[dict]:
+    return [
+        {
+            "role": "assistant",
+            "content": [{"type": "tool_use", "id": tool_use_id, "name": "read_file", "input": {"path": "a.txt"}}],
+        },
+        {"role": "user", "content": [{"type": "tool_result", "tool_use_id": tool_use_id, "content": "contents"}]},
+    ]
+
+
+def _assert_tool_pairs_intact(messages: list[dict]) -> None:
+    """Every tool_use must be answered by a tool_result in the message right after it."""
+    for i, message in enumerate(messages):
+        if message["role"] != "assistant" or isinstance(message["content"], str):
+            continue
+        tool_use_ids = [block["id"] for block in message["content"] if block["type"] == "tool_use"]
+        if not tool_use_ids:
+            continue
+        answer = messages[i + 1]["content"]
+        assert [block["tool_use_id"] for block in answer if block["type"] == "tool_result"] == tool_use_ids
+
+
+CONVERSATION = [
+    {"role": "user", "content": "first"},
+    *_tool_round("toolu_1"),
+    {"role": "assistant", "content": [{"type": "text", "text": "done"}]},
+    {"role": "user", "content": "second"},
+    *_tool_round("toolu_2"),
+    {"role": "assistant", "content": [{"type": "text", "text": "done"}]},
+    {"role": "user", "content": "third"},
+    *_tool_round("toolu_3"),
+]
+
+
+def test_small_conversation_is_left_alone():
+    client = _client(input_tokens=1_000)
+
+    assert _compact(client, CONVERSATION) is CONVERSATION
+    client.messages.create.assert_not_called()
+
+
+def test_summary_keeps_tool_use_and_tool_result_pairs_together():
+    compacted = _compact(_client(input_tokens=compaction.CONTEXT_WINDOW), CONVERSATION)
+
+    assert compacted[0] == CONVERSATION[0]
+    assert compacted[1]["role"] == "assistant"
+    assert "SUMMARY" in compacted[1]["content"][0]["text"]
+    # the last two user turns are kept verbatim
+    assert compacted[2:] == CONVERSATION[4:]
+    _assert_tool_pairs_intact(compacted)
+
+
+def test_single_long_turn_drops_older_tool_results():
+    messages = [{"role": "user", "content": "first"}, *_tool_round("toolu_1"), *_tool_round("toolu_2")]
+
+    compacted = _compact(_client(input_tokens=compaction.CONTEXT_WINDOW), messages)
+
+    assert compacted[2]["content"][0]["content"] == compaction.DROPPED_TOOL_RESULT
+    # the results the LLM is about to respond to are kept
+    assert compacted[-1] == messages[-1]
+    _assert_tool_pairs_intact(compacted)
+    # the original conversation is not modified
+    assert messages[2]["content"][0]["content"] == "contents"
+
+
+def test_compacting_a_summarized_conversation_again_drops_tool_results():
+    client = _client(input_tokens=compaction.CONTEXT_WINDOW)
+
+    summarized = _compact(client, CONVERSATION)
+    compacted = _compact(client, summarized)
+
+    # the summary is not summarized again, the older tool results are dropped instead
+    client.messages.create.assert_called_once()
+    assert compacted[:2] == summarized[:2]
+    assert compacted[4]["content"][0]["content"] == compaction.DROPPED_TOOL_RESULT
+    assert compacted[-1] == summarized[-1]
+    _assert_tool_pairs_intact(compacted)
+
+
+def test_failed_summary_falls_back_to_dropping_tool_results():
+    client = _client(input_tokens=compaction.CONTEXT_WINDOW, summary_error=CONNECTION_ERROR)
+
+    compacted = _compact(client, CONVERSATION)
+
+    assert len(compacted) == len(CONVERSATION)
+    assert compacted[2]["content"][0]["content"] == compaction.DROPPED_TOOL_RESULT
+    assert compacted[-1] == CONVERSATION[-1]
+    _assert_tool_pairs_intact(compacted)
+
+
+def test_failed_token_count_leaves_the_conversation_alone():
+    client = _client(input_tokens=compaction.CONTEXT_WINDOW, count_error=CONNECTION_ERROR)
+    budget = compaction.TokenBudget(input_tokens=1_000, message_count=4)
+    # the long message forces a recount
+    messages = [*CONVERSATION, {"role": "user", "content": "x" * 10_000}]
+
+    compacted = asyncio.run(
+        compaction.compact_if_needed(
+            client=client,
+            console=Console(file=io.StringIO()),
+            system_prompt="system",
+            messages=messages,
+            tool_schemas=[],
+            budget=budget,
+        )
+    )
+
+    assert compacted is messages
+    assert budget == compaction.TokenBudget(input_tokens=1_000, message_count=4)
+    client.messages.create.assert_not_called()
@@ -0,0 +1,145 @@
+"""Tests for building and retrying LLM requests."""
+
+from types import SimpleNamespace
+
+import anthropic
+import httpx
+import pytest
+
+from alduin import compaction, llm
+
+REQUEST = httpx.Request("POST", "https://api.anthropic.com/v1/messages")
+
+TOOL_SCHEMAS = [{"name": "read_file", "input_schema": {}}, {"name": "list_files", "input_schema": {}}]
+
+
+def _count_breakpoints(params: dict) -> int:
+    blocks = [*params["system"], *params.get("tools", [])]
+    for message in params["messages"]:
+        if isinstance(message["content"], list):
+            blocks.extend(message["content"])
+    return sum("cache_control" in block for block in blocks)
+
+
+def test_last_message_is_marked_as_cacheable_without_modifying_the_conversation():
+    messages = [
+        {"role": "user", "content": "first"},
+        {"role": "assistant", "content": [{"type": "text", "text": "done"}]},
+        {"role": "user", "content": "second"},
+    ]
+
+    params = llm.request_params("system", messages, TOOL_SCHEMAS)
+
+    assert params["messages"][:-1] == messages[:-1]
+    assert params["messages"][-1]["content"] == [{"type": "text", "text": "second", "cache_control": llm.CACHE_CONTROL}]
+    assert messages[-1]["content"] == "second"
+    assert "cache_control" in params["tools"][-1]
+    assert _count_breakpoints(params) == 3
+
+
+def test_cache_breakpoints_stay_within_the_limit_after_a_summary():
+    summary = {
+        "role": "assistant",
+        "content": [{"type": "text", "text": compaction.SUMMARY_PREFIX + "...", "cache_control": llm.CACHE_CONTROL}],
+    }
+    tool_result = {"type": "tool_result", "tool_use_id": "toolu_1", "content": "contents"}
+    messages = [{"role": "user", "content": "first"}, summary, {"role": "user", "content": [tool_result]}]
+
+    params = llm.request_params("system", messages, TOOL_SCHEMAS)
+
+    assert params["messages"][-1]["content"] == [{**tool_result, "cache_control": llm.CACHE_CONTROL}]
+    assert _count_breakpoints(params) == llm.MAX_CACHE_BREAKPOINTS
+
+    # with one more breakpoint already in the conversation, the last message is left alone
+    messages.insert(1, summary)
+    params = llm.request_params("system", messages, TOOL_SCHEMAS)
+
+    assert params["messages"] is messages
+    assert _count_breakpoints(params) == llm.MAX_CACHE_BREAKPOINTS
+
+
+def test_batch_requests_do_not_cache_the_conversation():
+    messages = [{"role": "user", "content": "prompt"}]
+
+    params = llm.request_params("system", messages, tool_schemas=[], cache_conversation=False)
+
+    assert params["messages"] is messages
+    assert "tools" not in params
+    assert _count_breakpoints(params) == 1
+
+
+def _status_error(
+    status_code: int, error_type: str = "api_error", headers: dict | None = None
+) -> anthropic.APIStatusError:
+    body = {"type": "error", "error": {"type": error_type, "message": "boom"}}
+    response = httpx.Response(status_code, headers=headers, json=body, request=REQUEST)
+    return anthropic.APIStatusError("boom", response=response, body=body)
+
+
+def _retry_state(error: BaseException) -> SimpleNamespace:
+    return SimpleNamespace(attempt_number=1, outcome=SimpleNamespace(exception=lambda: error))
+
+
+@pytest.mark.parametrize(
+    ("error", "transient"),
+    [
+        (anthropic.APIConnectionError(request=REQUEST), True),
+        (_status_error(429, "rate_limit_error"), True),
+        (_status_error(529, "overloaded_error"), True),
+        (_status_error(500), True),
+        (_status_error(400, "invalid_request_error"), False),
+        # errors raised inside a started stream carry the stream's 200 status
+        (_status_error(200, "overloaded_error"), True),
+        (_status_error(200, "invalid_request_error"), False),
+        (ValueError("not an API error"), False),
+    ],
+)
+def test_only_transient_errors_are_retried(error, transient):
+    assert llm._is_transient_error(error) is transient
+
+
+@pytest.mark.parametrize(
+    ("headers", "wait"),
+    [
+        ({"retry-after-ms": "1500"}, 1.5),
+        ({"retry-after": "3"}, 3.0),
+        ({"retry-after-ms": "250", "retry-after": "1"}, 0.25),
+        ({"retry-after": "3600"}, llm.MAX_RETRY_WAIT_SECONDS),
+    ],
+)
+def test_retry_waits_as_long_as_the_api_asks(headers, wait):
+    assert llm._wait_for_retry(_retry_state(_status_error(429, "rate_limit_error", headers))) == wait
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        _status_error(529, "overloaded_error"),
+        _status_error(429, "rate_limit_error", {"retry-after": "Wed, 21 Oct 2015 07:28:00 GMT"}),
+        anthropic.APIConnectionError(request=REQUEST),
+    ],
+)
+def test_retry_backs_off_without_a_usable_retry_after(error):
+    assert 0 <= llm._wait_for_retry(_retry_state(error)) <= llm.MAX_RETRY_WAIT_SECONDS
+
+
+def test_batches_are_split_by_request_count_and_size(monkeypatch):
+    requests = [{"messages": [{"role": "user", "content": str(i)}]} for i in range(5)]
+
+    monkeypatch.setattr(llm, "MAX_BATCH_REQUESTS", 2)
+    batches = llm._split_into_batches(requests)
+
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    # custom ids stay unique across batches so responses can be matched back in order
+    assert [entry["custom_id"] for batch in batches for entry in batch] == [f"request-{i}" for i in range(5)]
+    assert [entry["params"] for batch in batches for entry in batch] == requests
+
+    monkeypatch.setattr(llm, "MAX_BATCH_REQUESTS", 100)
+    monkeypatch.setattr(llm, "MAX_BATCH_BYTES", 160)
+    assert [len(batch) for batch in llm._split_into_batches(requests)] == [2, 2, 1]
+
+
+def test_oversized_request_gets_a_batch_of_its_own(monkeypatch):
+    monkeypatch.setattr(llm, "MAX_BATCH_BYTES", 10)
+
+    assert [len(batch) for batch in llm._split_into_batches([{}, {}])] == [1, 1]
@@ -0,0 +1,124 @@
+"""Tests for tool execution in the agent loop."""
+
+import asyncio
+import io
+import os
+import re
+
+import pytest
+from anthropic.types import ToolUseBlock
+from rich.console import Console
+
+from alduin import main, tool
+
+ACTIVE_TOOL_NAMES = frozenset({"read_file", "list_files", "fetch_chunk"})
+
+
+@pytest.fixture
+def read_file_calls(monkeypatch: pytest.MonkeyPatch) -> list[str]:
+    """Count the calls reaching read_file."""
+    calls: list[str] = []
+
+    def counting_read_file(path: str) -> str:
+        calls.append(path)
+        return tool.read_file(path)
+
+    monkeypatch.setitem(tool.REGISTRY, "read_file", counting_read_file)
+    return calls
+
+
+def _read_file_block(block_id: str, path: str) -> ToolUseBlock:
+    return ToolUseBlock(type="tool_use", id=block_id, name="read_file", input={"path": path})
+
+
+def _execute(blocks: list[ToolUseBlock], tool_cache: dict) -> list[str]:
+    return asyncio.run(
+        main.execute_tools(
+            tool_use_blocks=blocks,
+            active_tool_names=ACTIVE_TOOL_NAMES,
+            tool_cache=tool_cache,
+            concurrency_limit=2,
+            console=Console(file=io.StringIO()),
+        )
+    )
+
+
+def test_identical_calls_run_once_and_answer_every_tool_use(tmp_path, read_file_calls):
+    a = tmp_path / "a.txt"
+    b = tmp_path / "b.txt"
+    a.write_text("alpha")
+    b.write_text("beta")
+    blocks = [
+        _read_file_block("toolu_1", str(a)),
+        _read_file_block("toolu_2", str(b)),
+        _read_file_block("toolu_3", str(a)),
+    ]
+
+    results = _execute(blocks, tool_cache={})
+
+    tool_results = [{"tool_use_id": block.id, "content": result} for block, result in zip(blocks, results)]
+    assert tool_results == [
+        {"tool_use_id": "toolu_1", "content": "alpha"},
+        {"tool_use_id": "toolu_2", "content": "beta"},
+        {"tool_use_id": "toolu_3", "content": "alpha"},
+    ]
+    assert sorted(read_file_calls) == sorted([str(a), str(b)])
+
+
+def test_cached_result_is_reused_while_file_is_unchanged(tmp_path, read_file_calls):
+    path = tmp_path / "a.txt"
+    path.write_text("alpha")
+    tool_cache: dict = {}
+
+    assert _execute([_read_file_block("toolu_1", str(path))], tool_cache) == ["alpha"]
+    assert _execute([_read_file_block("toolu_2", str(path))], tool_cache) == ["alpha"]
+    assert read_file_calls == [str(path)]
+
+
+def test_cached_result_is_invalidated_when_file_changes(tmp_path, read_file_calls):
+    path = tmp_path / "a.txt"
+    path.write_text("alpha")
+    tool_cache: dict = {}
+
+    assert _execute([_read_file_block("toolu_1", str(path))], tool_cache) == ["alpha"]
+
+    path.write_text("omega")
+    # make sure the modification time moves even on filesystems with coarse timestamps
+    mtime_ns = path.stat().st_mtime_ns + 1_000_000_000
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+    assert _execute([_read_file_block("toolu_2", str(path))], tool_cache) == ["omega"]
+    assert read_file_calls == [str(path), str(path)]
+
+
+def test_cached_large_result_can_still_be_fetched(tmp_path, read_file_calls):
+    path = tmp_path / "large.txt"
+    path.write_text("x" * 10_000)
+    tool_cache: dict = {}
+
+    _execute([_read_file_block("toolu_1", str(path))], tool_cache)
+    # push the stored result out by truncating many other large results in between
+    for i in range(tool.MAX_STORED_RESULTS):
+        tool.compact_result(str(i) * 5_000)
+    (envelope,) = _execute([_read_file_block("toolu_2", str(path))], tool_cache)
+
+    assert read_file_calls == [str(path)]
+    result_id = re.search(r"result_id=(\w+)", envelope).group(1)
+    assert tool.fetch_chunk(result_id, tool.SNIPPET_LENGTH).startswith("x")
+
+
+def test_arguments_with_oversized_integers_are_handled():
+    # the model can send integers beyond 64 bits, which must not crash the session
+    block = ToolUseBlock(
+        type="tool_use", id="toolu_1", name="fetch_chunk", input={"result_id": "missing", "offset": 2**70}
+    )
+
+    assert (
+        _execute([block, block], tool_cache={})
+        == ["Error: no stored result with id missing, call the original tool again"] * 2
+    )
+
+
+def test_unknown_and_inactive_tools_return_an_error():
+    assert main.execute_tool("nope", ACTIVE_TOOL_NAMES, {}) == ("Error: Requested tool do not exists nope", True)
+    assert main.execute_tool("bash", ACTIVE_TOOL_NAMES, {"command": "ls"})[1] is True
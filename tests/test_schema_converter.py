@@ -0,0 +1,59 @@
+"""Tests for converting Python functions to tool schemas."""
+
+from alduin import schema_converter
+
+
+def test_minify_drops_titles_and_collapses_descriptions():
+    schema = {
+        "name": "read_file",
+        "title": "Read File",
+        "description": "Read a file.\n\n    Returns its\tcontents.",
+        "input_schema": {
+            "type": "object",
+            "properties": {"path": {"type": "string", "title": "Path", "description": "The   file path."}},
+            "required": ["path"],
+        },
+    }
+
+    assert schema_converter._minify_schema(schema) == {
+        "name": "read_file",
+        "description": "Read a file. Returns its contents.",
+        "input_schema": {
+            "type": "object",
+            "properties": {"path": {"type": "string", "description": "The file path."}},
+            "required": ["path"],
+        },
+    }
+
+
+def test_minify_keeps_arguments_named_like_schema_keywords():
+    properties = {"title": {"type": "string"}, "description": {"type": "string"}}
+
+    minified = schema_converter._minify_schema({"type": "object", "properties": properties})
+
+    assert minified["properties"] == properties
+
+
+def test_minify_truncates_long_descriptions():
+    description = schema_converter._minify_description("word " * 100)
+
+    assert len(description) == schema_converter.MAX_DESCRIPTION_LENGTH
+    assert description.endswith("…")
+
+
+def test_minified_tool_schemas_keep_the_arguments():
+    def read_file(path: str, offset: int = 0) -> str:
+        """Read a file.
+
+        Args:
+            path: The path of the file.
+            offset: The line to start reading at.
+        """
+
+    (schema,) = schema_converter.generate_tool_schema([read_file], minify=True)
+
+    assert schema["input_schema"]["properties"] == {
+        "path": {"type": "string", "description": "The path of the file."},
+        "offset": {"type": "integer", "description": "The line to start reading at."},
+    }
+    assert schema["input_schema"]["required"] == ["path"]
@@ -0,0 +1,56 @@
+"""Tests for the tool implementations."""
+
+import re
+
+from alduin import tool
+
+
+def _result_id(envelope: str) -> str:
+    return re.search(r"result_id=(\w+)", envelope).group(1)
+
+
+def test_small_and_empty_results():
+    assert tool.compact_result("hello") == "hello"
+    assert tool.compact_result("  \n") == "(empty result)"
+
+
+def test_large_result_can_be_paged_back_together():
+    content = "".join(f"line {i}\n" for i in range(2_000))
+    envelope = tool.compact_result(content)
+
+    assert len(envelope) < len(content)
+    assert envelope.startswith("[truncated")
+    assert content[: tool.SNIPPET_LENGTH] in envelope
+
+    result_id = _result_id(envelope)
+    offset = tool.SNIPPET_LENGTH
+    pages = [content[:offset]]
+    while True:
+        chunk = tool.fetch_chunk(result_id, offset)
+        match = re.search(r"\n\[\d+ characters left, continue with offset=(\d+)\]$", chunk)
+        if match is None:
+            pages.append(chunk)
+            break
+        pages.append(chunk[: match.start()])
+        offset = int(match.group(1))
+
+    assert "".join(pages) == content
+
+
+def test_fetch_chunk_rejects_out_of_range_offsets():
+    content = "x" * (tool.LARGE_RESULT_THRESHOLD + 1)
+    result_id = _result_id(tool.compact_result(content))
+
+    assert tool.fetch_chunk(result_id, -5).startswith("Error: offset -5 is out of range")
+    assert tool.fetch_chunk(result_id, len(content)).startswith("Error: offset")
+
+
+def test_fetch_chunk_unknown_id():
+    assert tool.fetch_chunk("0" * 40).startswith("Error: no stored result")
+
+
+def test_only_recent_results_are_stored():
+    result_ids = [_result_id(tool.compact_result(str(i) * 5_000)) for i in range(tool.MAX_STORED_RESULTS + 1)]
+
+    assert tool.fetch_chunk(result_ids[0]).startswith("Error: no stored result")
+    assert not tool.fetch_chunk(result_ids[-1]).startswith("Error")